@@ -14,7 +14,22 @@ https://numpydoc.readthedocs.io/en/latest/format.html
 
 import os
 import re
+import json
+import gzip
+import shutil
+import hashlib
 import requests
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli as _brotli
+except ImportError:
+    # brotli is optional, only needed for '.br' precompressed output
+    _brotli = None
+
+# version of the HTML produced by build_page and functions_html, this must be
+# bumped whenever their markup changes so incremental builds rebuild all pages
+RENDERER_VERSION = 1
 
 def extract_params(text):
     """
@@ -185,6 +200,7 @@ def functions_html(funcs):
     html : str
         The HTML code built.
     """
+    # bump RENDERER_VERSION when changing the markup below
     html = """
         <h2>Functions</h2>
         <br>
@@ -289,7 +305,8 @@ def build_readme(pages, markdown=None):
     pass
 
 
-def build_page(module, devs, desc, classes="", funcs="", submodule=""):
+def build_page(module, devs, desc, classes="", funcs="", submodule="",
+               assets=None):
     """
     Function for building HTML docs using extracted data.
 
@@ -310,11 +327,27 @@ def build_page(module, devs, desc, classes="", funcs="", submodule=""):
     submodule : str, optional
         String containing the submodule name, if within a submodule, eg class.
         The default is "".
+    assets : dict, optional
+        Dictionary mapping template asset paths (eg
+        'templates/bootstrap.min.css') to their fingerprinted equivalents, as
+        returned by fingerprint_assets. Any asset not included is referenced
+        by its original path. The default is None.
 
     Returns
     -------
     None.
     """
+    # bump RENDERER_VERSION when changing the markup below
+    # assets not given a fingerprinted name keep their original path
+    if assets is None:
+        assets = {}
+    css = assets.get('templates/bootstrap.min.css',
+                     'templates/bootstrap.min.css')
+    navbar = assets.get('templates/navbar.js', 'templates/navbar.js')
+    jquery = assets.get('templates/jquery.min.js', 'templates/jquery.min.js')
+    bundle = assets.get('templates/bootstrap.bundle.min.js',
+                        'templates/bootstrap.bundle.min.js')
+
     # assign fullpath as list of module and (optionally) submodule
     if submodule != "":
         fullpath = [module, submodule]
@@ -334,14 +367,14 @@ def build_page(module, devs, desc, classes="", funcs="", submodule=""):
 
 <title>{fullpath[-1]} docs</title>
 
-<link href="templates/bootstrap.min.css" rel="stylesheet">
+<link href="{css}" rel="stylesheet">
 
 </head>
 
 <body>
 
 <!-- Navigation -->
-<script src="templates/navbar.js"></script>
+<script src="{navbar}"></script>
 
 <!-- Page Content -->
 <div class="container">
@@ -432,15 +465,15 @@ def build_page(module, devs, desc, classes="", funcs="", submodule=""):
         html += functions_html(funcs)
 
     # add end of html
-    html += """
+    html += f"""
   </div>
 </div>
 </div>
 <br>
 
 <!-- Bootstrap core JavaScript -->
-<script src="templates/jquery.min.js"></script>
-<script src="templates/bootstrap.bundle.min.js"></script>
+<script src="{jquery}"></script>
+<script src="{bundle}"></script>
 
 </body>
 
@@ -450,12 +483,17 @@ def build_page(module, devs, desc, classes="", funcs="", submodule=""):
     return html
 
 
-def output(code, filename, path="docs"):
+def output(code, filename, path="docs", overwrite=False):
     """
     Function to control saving of HTML files.
 
     Parameters
     ----------
+    code : str
+        The code to be saved.
+    filename : str
+        Name of the file to save, '.html' is appended if no accepted file
+        extension is given.
     path : str, optional
         String containing the local/global filepath to the Documentation
         directory. The HTML files will be saved here.
@@ -469,7 +507,9 @@ def output(code, filename, path="docs"):
 
     Returns
     -------
-    None.
+    filepath : str
+        The path the file was actually saved to. This will differ from the
+        path given if the user chose not to overwrite an existing file.
     """
     
     file_types = ['.html', '.css', '.js']  # accepted file extensions
@@ -484,7 +524,7 @@ def output(code, filename, path="docs"):
         os.makedirs(path)
 
     # check if file exists and warn user if so
-    if os.path.exists(os.path.join(path, filename)):
+    if os.path.exists(os.path.join(path, filename)) and not overwrite:
         overwrite = input(f"Warning: '{filename}' already exists, do you "
                            "want to overwrite? (Y/N)\n>>> ")
         if overwrite.lower()[0] == 'y':
@@ -499,6 +539,8 @@ def output(code, filename, path="docs"):
         print(f"{filename.split('.')[-1].upper()} file saved to "
               f"'{os.path.join(path, filename)}'.")
 
+    return os.path.join(path, filename)
+
 
 def bootstrap_download(docs_dir="docs"):
     """
@@ -534,6 +576,331 @@ def bootstrap_download(docs_dir="docs"):
                path=os.path.join(docs_dir, 'templates'))
 
 
+def content_hash(data):
+    """
+    Function used to build a content hash, used for fingerprinting filenames
+    and checking whether a file has changed since it was last processed.
+
+    Parameters
+    ----------
+    data : bytes
+        The file contents to be hashed.
+
+    Returns
+    -------
+    digest : str
+        SHA-256 hex digest of the given contents.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def fingerprint_assets(docs_dir="docs", length=10):
+    """
+    Function used to copy each CSS/JS file within the templates folder of the
+    documentation directory to a content-hashed filename, for example
+    'bootstrap.min.css' becomes 'bootstrap.min.1a2b3c4d5e.css'. As the name
+    changes whenever the contents change, these files can be served with long
+    cache lifetimes.
+
+    Parameters
+    ----------
+    docs_dir : str, optional
+        The local/global path to the documentation directory. This should
+        contain a 'templates' folder with the assets to be fingerprinted.
+        The default is 'docs'.
+    length : int, optional
+        Number of hex characters of the content hash to include in the
+        fingerprinted filename. The default is 10.
+
+    Returns
+    -------
+    assets : dict
+        Dictionary mapping each original asset path (relative to docs_dir) to
+        its fingerprinted path, eg 'templates/bootstrap.min.css' to
+        'templates/bootstrap.min.1a2b3c4d5e.css'. This is also saved to
+        'manifest.json' within the templates folder.
+    """
+    templates = os.path.join(docs_dir, 'templates')
+    # match files which are already fingerprinted so we do not hash them again
+    hashed_re = re.compile(r"\.[0-9a-f]{%d}\.(css|js)$" % length)
+
+    assets = {}
+    for filename in sorted(os.listdir(templates)):
+        # only fingerprint original CSS/JS assets
+        if not filename.endswith(('.css', '.js')) or hashed_re.search(filename):
+            continue
+        with open(os.path.join(templates, filename), 'rb') as fp:
+            digest = content_hash(fp.read())[:length]
+        # insert hash before the file extension
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{stem}.{digest}{ext}"
+        # copy only if this version of the asset does not already exist
+        if not os.path.exists(os.path.join(templates, hashed)):
+            shutil.copyfile(os.path.join(templates, filename),
+                            os.path.join(templates, hashed))
+        assets[f"templates/{filename}"] = f"templates/{hashed}"
+
+    # save manifest of original to fingerprinted asset names
+    with open(os.path.join(templates, 'manifest.json'), 'w') as fp:
+        json.dump(assets, fp, indent=2)
+
+    return assets
+
+
+def compress_file(filepath, brotli=False):
+    """
+    Function used to write precompressed siblings of a file, '.gz' and
+    optionally '.br', so that they can be served directly by a CDN.
+
+    Parameters
+    ----------
+    filepath : str
+        The local/global path to the file to be compressed.
+    brotli : Boolean, optional
+        True/False determining whether a '.br' file is also written. Requires
+        the brotli package. If False, any existing '.br' file is removed so
+        that it cannot be served out of date. The default is False.
+
+    Returns
+    -------
+    filepath : str
+        The path of the source file that was compressed.
+    """
+    with open(filepath, 'rb') as fp:
+        data = fp.read()
+    # mtime is fixed so unchanged files produce identical gzip output
+    with open(f"{filepath}.gz", 'wb') as fp:
+        fp.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(f"{filepath}.br", 'wb') as fp:
+            fp.write(_brotli.compress(data))
+    elif os.path.exists(f"{filepath}.br"):
+        os.remove(f"{filepath}.br")
+    return filepath
+
+
+def compress_outputs(path="docs", brotli=False, workers=None):
+    """
+    Function used to precompress every HTML/CSS/JS file within the
+    documentation directory. Compression is run in parallel, and files which
+    have not changed since they were last compressed, with the same
+    encodings, are skipped. Compressed files whose source no longer exists
+    are removed.
+
+    Parameters
+    ----------
+    path : str, optional
+        String containing the local/global filepath to the Documentation
+        directory. The default is 'docs'.
+    brotli : Boolean, optional
+        True/False determining whether '.br' files are written alongside the
+        '.gz' files. Requires the brotli package. The default is False.
+    workers : int, optional
+        Maximum number of threads used for compression. The default is None,
+        which lets ThreadPoolExecutor decide.
+
+    Returns
+    -------
+    compressed : list
+        List of the file paths which were (re)compressed.
+    """
+    if brotli and _brotli is None:
+        raise ImportError("'brotli' package is required for '.br' output.")
+
+    # load content hashes of previously compressed files
+    cache_path = os.path.join(path, '.compress-cache.json')
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as fp:
+            cache = json.load(fp)
+    else:
+        cache = {}
+
+    # record which encodings are written so switching modes recompresses
+    encodings = ['gz', 'br'] if brotli else ['gz']
+
+    # find all files that have changed or are missing compressed siblings,
+    # only files seen in this walk are kept in the cache
+    todo = []
+    seen = {}
+    for root, _, files in os.walk(path):
+        for filename in files:
+            if not filename.endswith(('.html', '.css', '.js')):
+                continue
+            filepath = os.path.join(root, filename)
+            key = os.path.relpath(filepath, path).replace(os.sep, '/')
+            with open(filepath, 'rb') as fp:
+                digest = content_hash(fp.read())
+            seen[key] = {'hash': digest, 'encodings': encodings}
+            siblings = [f"{filepath}.{enc}" for enc in encodings]
+            if cache.get(key) == seen[key] and \
+                    all([os.path.exists(sib) for sib in siblings]):
+                continue
+            todo.append(filepath)
+
+    # remove compressed siblings of files which no longer exist
+    for key in cache:
+        if key not in seen:
+            for enc in ['gz', 'br']:
+                sibling = os.path.join(path, f"{key}.{enc}")
+                if os.path.exists(sibling):
+                    os.remove(sibling)
+
+    # compress in parallel, zlib and brotli release the GIL while compressing
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        compressed = list(pool.map(lambda fp: compress_file(fp, brotli), todo))
+
+    # save updated content hashes, dropping any files no longer present
+    with open(cache_path, 'w') as fp:
+        json.dump(seen, fp, indent=2)
+    print(f"{len(compressed)} file(s) compressed in '{path}'.")
+
+    return compressed
+
+
+def entity_hash(entity):
+    """
+    Function used to hash an extracted entity, such as a class description or
+    a function dictionary, so that it can be compared between builds.
+
+    Parameters
+    ----------
+    entity : str, dict, or list
+        Any JSON serialisable data extracted from the Python code. Keys are
+        not sorted, as extracted dictionaries are built in source order and
+        that order (eg of parameters) is rendered in the pages.
+
+    Returns
+    -------
+    digest : str
+        SHA-256 hex digest of the serialised entity.
+    """
+    return content_hash(json.dumps(entity).encode('utf-8'))
+
+
+def page_dependencies(module, desc, classes, funcs, assets=None):
+    """
+    Function used to record which source entities (symbols) each page built
+    by DocsBuilder depends on. Symbols are named by their dotted path, eg
+    'Docs.DocsBuilder.extract', and are mapped to a hash of their extracted
+    data. This must mirror what build_page renders for each page.
+
+    Parameters
+    ----------
+    module : str
+        String containing the module name.
+    desc : str
+        String describing the module.
+    classes : dict
+        Dictionary containing classes and their description, code, functions,
+        and variables.
+    funcs : dict
+        Dictionary containing functions and their descriptions and parameters.
+    assets : dict, optional
+        Dictionary mapping template asset paths to their fingerprinted
+        equivalents, as returned by fingerprint_assets. The default is None.
+
+    Returns
+    -------
+    graph : dict
+        Dictionary with page filenames as keys, each containing a dictionary
+        mapping the symbols used by that page to their hashes.
+    """
+    # every page references the template assets in its head/footer
+    if assets is None:
+        assets = {}
+    asset_deps = {f"asset:{name}": assets[name] for name in assets}
+
+    filename = module.lower().replace(" ", "_")
+    graph = {}
+
+    # module page shows the module description, the class tab list (names
+    # and descriptions only), and all module-level functions
+    deps = {module: entity_hash(desc)}
+    for name in classes:
+        deps[f"{module}.{name}"] = entity_hash(classes[name]['description'])
+    for name in funcs:
+        deps[f"{module}.{name}"] = entity_hash(funcs[name])
+    deps.update(asset_deps)
+    graph[filename] = deps
+
+    # class pages show the class description and its methods, the breadcrumb
+    # only uses the module name which is already part of the page filename
+    for c in classes:
+        deps = {f"{module}.{c}": entity_hash(classes[c]['description'])}
+        for name in classes[c]['funcs']:
+            deps[f"{module}.{c}.{name}"] = \
+                entity_hash(classes[c]['funcs'][name])
+        deps.update(asset_deps)
+        graph[f"{filename}.{c}"] = deps
+
+    return graph
+
+
+def diff_dependencies(old, new):
+    """
+    Function used to compare the symbols a page depended on in the previous
+    build against those it depends on now.
+
+    Parameters
+    ----------
+    old : dict
+        Dictionary mapping symbols to hashes from the previous build.
+    new : dict
+        Dictionary mapping symbols to hashes for the current build.
+
+    Returns
+    -------
+    reasons : list
+        List of reasons the page must be rebuilt, empty if the page is
+        unchanged.
+    """
+    reasons = []
+    for symbol in new:
+        if symbol not in old:
+            reasons.append(f"added {symbol}")
+        elif old[symbol] != new[symbol]:
+            reasons.append(f"changed {symbol}")
+    for symbol in old:
+        if symbol not in new:
+            reasons.append(f"removed {symbol}")
+    # pages list symbols in source order, so a reordering changes the page
+    if len(reasons) == 0 and list(old) != list(new):
+        reasons.append("reordered symbols")
+    return reasons
+
+
+def remove_page(page, path="docs"):
+    """
+    Function used to remove a page and its precompressed siblings from the
+    documentation directory, also dropping it from the compression cache.
+
+    Parameters
+    ----------
+    page : str
+        Page filename without the '.html' extension.
+    path : str, optional
+        String containing the local/global filepath to the Documentation
+        directory. The default is 'docs'.
+
+    Returns
+    -------
+    None.
+    """
+    filepath = os.path.join(path, f"{page}.html")
+    for target in [filepath, f"{filepath}.gz", f"{filepath}.br"]:
+        if os.path.exists(target):
+            os.remove(target)
+
+    # drop the page from the compression cache if there is one
+    cache_path = os.path.join(path, '.compress-cache.json')
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as fp:
+            cache = json.load(fp)
+        cache.pop(f"{page}.html", None)
+        with open(cache_path, 'w') as fp:
+            json.dump(cache, fp, indent=2)
+
+
 class DocsBuilder:
     """
     Class used for automatically generating HTML-based documentation from
@@ -644,9 +1011,18 @@ class DocsBuilder:
         #code = self.funcs_re.sub("", code)  # remove from code
 
 
-    def build(self, path="docs", overwrite=False):
+    def build(self, path="docs", overwrite=False, fingerprint=False,
+              compress=False, brotli=False, incremental=False):
         """
-        Function for building HTML docs using extracted data.
+        Function for building HTML docs using extracted data. The symbols each
+        page depends on are recorded to '.autodocs-graph.json' within the
+        documentation directory so that later builds can be incremental.
+
+        Build state is kept alongside the output: '.autodocs-graph.json',
+        '.compress-cache.json' (when compress is True), and
+        'templates/manifest.json' (when fingerprint is True). These are not
+        needed to serve the docs and should be excluded when uploading the
+        documentation directory to a CDN or web host.
 
         Parameters
         ----------
@@ -660,33 +1036,120 @@ class DocsBuilder:
             possible but a warning will appear if there are any pre-existing
             files, which will confirm the user's intention in overwritting or
             otherwise.
+        fingerprint : Boolean, optional
+            True/False determining whether template assets are copied to
+            content-hashed filenames and referenced by those names within the
+            pages built. The default is False.
+        compress : Boolean, optional
+            True/False determining whether precompressed '.gz' siblings are
+            written for every HTML/CSS/JS file in the documentation directory.
+            The default is False.
+        brotli : Boolean, optional
+            True/False determining whether '.br' siblings are also written.
+            Only valid when compress is True. The default is False.
+        incremental : Boolean, optional
+            True/False determining whether only pages whose symbols, or the
+            renderer, have changed since the previous build are rebuilt.
+            Pages of this module that no longer exist are removed. Pages are
+            owned by module name, so if the module itself is renamed the
+            pages built under its old name are not removed.
+            The default is False.
 
         Returns
         -------
-        None.
+        report : dict
+            Dictionary with each rebuilt or removed page as keys, containing a
+            list of reasons why.
         """
-        # we may end up with multiple pages, so initialise Dictionary
-        pages = {}
+        if brotli and not compress:
+            raise ValueError("'brotli' output requires 'compress' to be True.")
+        if brotli and _brotli is None:
+            raise ImportError("'brotli' package is required for '.br' output.")
+        # fingerprint template assets so pages reference versioned filenames
+        if fingerprint:
+            assets = fingerprint_assets(path)
+        else:
+            assets = None
         # filename version of module
         filename = self.module.lower().replace(" ", "_")
+
+        # record which symbols each page depends on
+        graph = page_dependencies(self.module, self.desc, self.classes,
+                                  self.funcs, assets=assets)
+        # load the dependency graph of the previous build
+        graph_path = os.path.join(path, '.autodocs-graph.json')
+        if os.path.exists(graph_path):
+            with open(graph_path, 'r') as fp:
+                old_graph = json.load(fp)
+        else:
+            old_graph = {}
+
+        # find which pages need rebuilding and why
+        report = {}
+        for page in graph:
+            if not incremental:
+                report[page] = ["full rebuild"]
+            elif page not in old_graph:
+                report[page] = ["new page"]
+            elif not os.path.exists(os.path.join(path, f"{page}.html")):
+                report[page] = ["output missing"]
+            elif old_graph[page].get('renderer') != RENDERER_VERSION:
+                report[page] = ["renderer changed"]
+            else:
+                reasons = diff_dependencies(old_graph[page]['depends'],
+                                            graph[page])
+                if len(reasons) > 0:
+                    report[page] = reasons
+
+        # we may end up with multiple pages, so initialise Dictionary
+        pages = {}
         # build top-level page
-        pages[filename] = \
-            build_page(self.module, self.devs, self.desc, self.classes,
-                       self.funcs)
+        if filename in report:
+            pages[filename] = \
+                build_page(self.module, self.devs, self.desc, self.classes,
+                           self.funcs, assets=assets)
         # iterate through classes (if any) and build page for each
-        if len(self.classes) > 0:
-            for c in self.classes:
-                print(f"{filename}.{c}")
-                print(c)
+        for c in self.classes:
+            if f"{filename}.{c}" in report:
                 pages[f"{filename}.{c}"] = \
                     build_page(self.module, self.devs,
                     self.classes[c]['description'], classes="",
-                    funcs=self.classes[c]['funcs'], submodule=c)
+                    funcs=self.classes[c]['funcs'], submodule=c,
+                    assets=assets)
 
-        # finally save all to file
+        # finally save all to file, recording the graph only for pages saved
+        # to their real filename, others keep their previous graph entry
         for page in pages:
-            output(pages[page], page, path=path)
+            saved = output(pages[page], page, path=path, overwrite=overwrite)
+            if saved == os.path.join(path, f"{page}.html"):
+                old_graph[page] = {
+                    'module': self.module,
+                    'renderer': RENDERER_VERSION,
+                    'depends': graph[page]
+                }
+
+        # remove pages of this module which no longer have a source entity
+        for page in list(old_graph):
+            if old_graph[page]['module'] == self.module and page not in graph:
+                remove_page(page, path=path)
+                del old_graph[page]
+                report[page] = ["removed, no longer in source"]
+
+        # save the updated dependency graph
+        with open(graph_path, 'w') as fp:
+            json.dump(old_graph, fp, indent=2)
+
+        # print rebuild report
+        print(f"{len(pages)} of {len(graph)} page(s) rebuilt.")
+        for page in report:
+            print(f"  {page}: {', '.join(report[page])}")
+
+        # write precompressed siblings for any changed files
+        if compress:
+            compress_outputs(path, brotli=brotli)
 
         # !!! TODO add top-level readme.html
         #readme = html_readme(pages)
-        #output(readme, 'readme.html', path='../')
\ No newline at end of file
+        #output(readme, 'readme.html', path='../')
+
+        return report